@@ -1,5 +1 @@
 __version__ = '0.1.0'
-
-
-from .main import cli
-cli()
\ No newline at end of file
@@ -10,7 +10,7 @@ import json
 from dataclasses import dataclass
 from itertools import product
 from typing import List
-from scipy import optimize
+from . import core
 
 
 POINTS_BEFORE_PUMP = 1_500
@@ -38,13 +38,9 @@ def compute_da_always_pumped(infile, outfile):
     raw_ds.read_direct(tmp_raw)
     with click.progressbar(range(shots), label="Computing dA") as shots:
         for shot_idx in shots:
-            for wl_idx in range(wavelengths):
-                par = tmp_raw[:, 0, shot_idx, wl_idx, 0]
-                ref = tmp_raw[:, 2, shot_idx, wl_idx, 0]
-                before_zero_par = par[:POINTS_BEFORE_PUMP]
-                before_zero_ref = ref[:POINTS_BEFORE_PUMP]
-                without_pump = np.mean(before_zero_par / before_zero_ref)
-                tmp_da[:, shot_idx, wl_idx] = -np.log10(par / ref / without_pump)
+            par = tmp_raw[:, 0, shot_idx, :, 0]
+            ref = tmp_raw[:, 2, shot_idx, :, 0]
+            tmp_da[:, shot_idx, :] = da_from_before_pump(par, ref)
     outfile["data"].write_direct(tmp_da)
     return
 
@@ -59,12 +55,11 @@ def compute_da_with_and_without_pump(infile, outfile):
     raw_ds.read_direct(tmp_raw)
     with click.progressbar(range(shots), label="Computing dA") as shots:
         for shot_idx in shots:
-            for wl_idx in range(wavelengths):
-                par_np = tmp_raw[:, 0, shot_idx, wl_idx, 1]
-                ref_np = tmp_raw[:, 2, shot_idx, wl_idx, 1]
-                par_wp = tmp_raw[:, 0, shot_idx, wl_idx, 0]
-                ref_wp = tmp_raw[:, 2, shot_idx, wl_idx, 0]
-                tmp_da[:, shot_idx, wl_idx] = -np.log10((par_wp / ref_wp) / (par_np / ref_np))
+            par_np = tmp_raw[:, 0, shot_idx, :, 1]
+            ref_np = tmp_raw[:, 2, shot_idx, :, 1]
+            par_wp = tmp_raw[:, 0, shot_idx, :, 0]
+            ref_wp = tmp_raw[:, 2, shot_idx, :, 0]
+            tmp_da[:, shot_idx, :] = -np.log10((par_wp / ref_wp) / (par_np / ref_np))
     outfile["data"].write_direct(tmp_da)
     return
 
@@ -79,17 +74,22 @@ def compute_perp_da(infile, outfile):
     raw_ds.read_direct(tmp_raw)
     with click.progressbar(range(shots), label="Computing dA") as shots:
         for shot_idx in shots:
-            for wl_idx in range(wavelengths):
-                perp = tmp_raw[:, 1, shot_idx, wl_idx, 0]
-                ref = tmp_raw[:, 2, shot_idx, wl_idx, 0]
-                before_zero_perp = perp[:POINTS_BEFORE_PUMP]
-                before_zero_ref = ref[:POINTS_BEFORE_PUMP]
-                without_pump = np.mean(before_zero_perp / before_zero_ref)
-                tmp_da[:, shot_idx, wl_idx] = -np.log10(perp / ref / without_pump)
+            perp = tmp_raw[:, 1, shot_idx, :, 0]
+            ref = tmp_raw[:, 2, shot_idx, :, 0]
+            tmp_da[:, shot_idx, :] = da_from_before_pump(perp, ref)
     outfile["data"].write_direct(tmp_da)
     return
 
 
+def da_from_before_pump(sig, ref) -> np.ndarray:
+    """Compute dA for a (points, wavelengths) array of shots that all have pump.
+
+    The signal without pump is taken from the points before the pump arrives.
+    """
+    without_pump = np.mean(sig[:POINTS_BEFORE_PUMP, :] / ref[:POINTS_BEFORE_PUMP, :], axis=0)
+    return -np.log10(sig / ref / without_pump)
+
+
 def compute_cd_always_pumped(infile, outfile, delta):
     """Compute dCD from the raw parallel and perpendicular channels when every shot is pumped.
     """
@@ -101,13 +101,12 @@ def compute_cd_always_pumped(infile, outfile, delta):
     coeff = (4 * delta) / 2.3
     with click.progressbar(range(shots), label="Computing CD") as shots:
         for shot_idx in shots:
-            for wl_idx in range(wavelengths):
-                par = tmp_raw[:, 0, shot_idx, wl_idx, 0]
-                perp = tmp_raw[:, 1, shot_idx, wl_idx, 0]
-                before_zero_par = par[:POINTS_BEFORE_PUMP]
-                before_zero_perp = perp[:POINTS_BEFORE_PUMP]
-                without_pump = np.mean(before_zero_perp / before_zero_par)
-                tmp_cd[:, shot_idx, wl_idx] = coeff * (perp / par - without_pump)
+            par = tmp_raw[:, 0, shot_idx, :, 0]
+            perp = tmp_raw[:, 1, shot_idx, :, 0]
+            before_zero_par = par[:POINTS_BEFORE_PUMP, :]
+            before_zero_perp = perp[:POINTS_BEFORE_PUMP, :]
+            without_pump = np.mean(before_zero_perp / before_zero_par, axis=0)
+            tmp_cd[:, shot_idx, :] = coeff * (perp / par - without_pump)
     outfile["data"].write_direct(tmp_cd)
     return
 
@@ -123,24 +122,27 @@ def compute_cd_with_and_without_pump(infile, outfile, delta):
     coeff = (4 * delta) / 2.3
     with click.progressbar(range(shots), label="Computing CD") as shots:
         for shot_idx in shots:
-            for wl_idx in range(wavelengths):
-                par_np = tmp_raw[:, 0, shot_idx, wl_idx, 1]
-                perp_np = tmp_raw[:, 1, shot_idx, wl_idx, 1]
-                par_wp = tmp_raw[:, 0, shot_idx, wl_idx, 0]
-                perp_wp = tmp_raw[:, 1, shot_idx, wl_idx, 0]
-                tmp_cd[:, shot_idx, wl_idx] = coeff * (perp_wp / par_wp - perp_np / par_np)
+            par_np = tmp_raw[:, 0, shot_idx, :, 1]
+            perp_np = tmp_raw[:, 1, shot_idx, :, 1]
+            par_wp = tmp_raw[:, 0, shot_idx, :, 0]
+            perp_wp = tmp_raw[:, 1, shot_idx, :, 0]
+            tmp_cd[:, shot_idx, :] = coeff * (perp_wp / par_wp - perp_np / par_np)
     outfile["data"].write_direct(tmp_cd)
     return
 
 
-def average(f):
+def average(f) -> np.ndarray:
     """Average all measurements for each wavelength.
+
+    The average is stored in the "average" dataset and also returned so that callers
+    don't need to read it back from the file.
     """
     da_ds = f["data"]
     points, shots, wls = da_ds.shape
-    avg_ds = f.create_dataset("average", (points, wls))
-    avg_ds.write_direct(np.nanmean(da_ds, axis=1))
-    return
+    avg_ds = f.create_dataset("average", (points, wls), dtype=np.float32)
+    avg = np.nanmean(da_ds, axis=1).astype(avg_ds.dtype, copy=False)
+    avg_ds.write_direct(avg)
+    return avg
 
 
 def subtract_background(f) -> None:
@@ -148,21 +150,53 @@ def subtract_background(f) -> None:
     """
     da_ds = f["data"]
     points, shots, wls = da_ds.shape
-    x = np.arange(points)
-    t_before_pump = x[:POINTS_BEFORE_PUMP]
-    tmp_da = np.empty((points, shots, wls))
-    da_ds.read_direct(tmp_da)
-    meas_indices = [x for x in product(range(shots), range(wls))]
-    with click.progressbar(meas_indices, label="Subtracting background") as indices:
-        for shot_idx, wl_idx in indices:
-            da_before_pump = tmp_da[:POINTS_BEFORE_PUMP, shot_idx, wl_idx]
-            (slope, intercept), _ = optimize.curve_fit(line, t_before_pump, da_before_pump)
-            background = line(x, slope, intercept)
-            tmp_da[:, shot_idx, wl_idx] -= background
-    da_ds.write_direct(tmp_da)
+    blocks = core.compute_splits(shots, core.shot_block_size(da_ds))
+    with click.progressbar(blocks, label="Subtracting background") as block_iter:
+        for start, stop in block_iter:
+            tmp_da = np.empty((points, stop - start, wls))
+            da_ds.read_direct(tmp_da, np.s_[:, start:stop, :])
+            tmp_da -= line_backgrounds(tmp_da)
+            da_ds.write_direct(tmp_da, dest_sel=np.s_[:, start:stop, :])
     return
 
 
+def subtract_background_and_average(f) -> np.ndarray:
+    """Subtract a linear background from a set of dA curves and average them.
+
+    This is equivalent to `subtract_background` followed by `average`, but the "data"
+    dataset is only read once. The average is returned as well as stored in the file.
+    """
+    da_ds = f["data"]
+    points, shots, wls = da_ds.shape
+    avg_ds = f.create_dataset("average", (points, wls), dtype=np.float32)
+    total = np.zeros((points, wls))
+    counts = np.zeros((points, wls))
+    blocks = core.compute_splits(shots, core.shot_block_size(da_ds))
+    with click.progressbar(blocks, label="Subtracting background") as block_iter:
+        for start, stop in block_iter:
+            tmp_da = np.empty((points, stop - start, wls))
+            da_ds.read_direct(tmp_da, np.s_[:, start:stop, :])
+            tmp_da -= line_backgrounds(tmp_da)
+            da_ds.write_direct(tmp_da, dest_sel=np.s_[:, start:stop, :])
+            total += np.nansum(tmp_da, axis=1)
+            counts += np.count_nonzero(~np.isnan(tmp_da), axis=1)
+    avg = (total / counts).astype(avg_ds.dtype, copy=False)
+    avg_ds.write_direct(avg)
+    return avg
+
+
+def line_backgrounds(da) -> np.ndarray:
+    """Compute the linear background of each curve in a (points, shots, wavelengths) array.
+
+    The lines are fit to the points before the pump, and all of the curves are fit at once.
+    """
+    points, shots, wls = da.shape
+    x = np.arange(points)
+    da_before_pump = da[:POINTS_BEFORE_PUMP, :, :].reshape((POINTS_BEFORE_PUMP, shots * wls))
+    slopes, intercepts = np.polyfit(x[:POINTS_BEFORE_PUMP], da_before_pump, 1)
+    return line(x[:, np.newaxis], slopes, intercepts).reshape((points, shots, wls))
+
+
 def line(x, m, b) -> np.ndarray:
     """Compute a line for use with background subtraction.
     """
@@ -207,29 +241,27 @@ def remove_avg_offsets(dataset, offset_points, ds_name="average"):
 def collapse(data, times, cpoints):
     """Reduce the number of points in a dataset by averaging multiple points together.
     """
-    # Just copy the whole array, we'll need all of the points before the second period anyway
-    tmp = np.copy(data)
-    # Fast forward to the beginning of the second period
-    orig_t_idx = 0
-    cutoff_indices = []
-    for t in times:
-        while True:
-            if data[orig_t_idx, 0] < t:
-                orig_t_idx += 1
-            else:
-                cutoff_indices.append(orig_t_idx)
-                break
+    # Keep every point before the first cutoff time as-is
+    cutoff_indices = list(np.searchsorted(data[:, 0], times, side="left"))
+    # The last interval is one point longer than the data, which sets how many groups it is split into
     cutoff_indices.append(data.shape[0] + 1)
-    output_idx = cutoff_indices[0]
+    sections = [data[:cutoff_indices[0], :]]
     for i in range(len(cutoff_indices) - 1):
         start = cutoff_indices[i]
         stop = cutoff_indices[i + 1]
-        num_splits = np.ceil((stop - start) / cpoints[i])
-        splits = np.array_split(data[start:stop, :], num_splits)
-        for s in splits:
-            tmp[output_idx, :] = s.mean(axis=0)
-            output_idx += 1
-    output_data = tmp[:output_idx, :]
+        section = data[start:stop, :]
+        if section.shape[0] == 0:
+            continue
+        # These are the same groups of points that np.array_split would produce, but the
+        # means are computed for all of the groups at once. Asking for more groups than there
+        # are points would only add empty groups, so those are left out.
+        num_splits = min(int(np.ceil((stop - start) / cpoints[i])), section.shape[0])
+        size, extra = divmod(section.shape[0], num_splits)
+        sizes = np.full(num_splits, size)
+        sizes[:extra] += 1
+        starts = np.cumsum(sizes) - sizes
+        sections.append(np.add.reduceat(section, starts, axis=0) / sizes[:, np.newaxis])
+    output_data = np.vstack(sections)
     return output_data
 
 
@@ -252,6 +284,7 @@ def multi_exp(x, *args) -> np.ndarray:
 def lfits_for_gfit(data, ts, fit_after_time, bounded_lifetimes):
     """Do local fits for each curve to provide a starting point for the global fit.
     """
+    from scipy import optimize
     n_wls = data.shape[1]
     n_lifetimes = len(bounded_lifetimes)
     lfit_params = np.empty((n_lifetimes, n_wls))
@@ -262,11 +295,11 @@ def lfits_for_gfit(data, ts, fit_after_time, bounded_lifetimes):
     amp_guesses = [-0.001 for x in range(n_lifetimes)]
     guesses = amp_guesses + [b.lifetime for b in bounded_lifetimes]
     fit_bounds = (lower, upper)
+    after = ts > fit_after_time
+    ts_for_fit = ts[after]
     for i in range(n_wls):
-        ys = data[:, i]
-        res, _ = optimize.curve_fit(multi_exp, ts[ts > fit_after_time], ys[ts > fit_after_time], p0=guesses, bounds=fit_bounds)
-        amplitudes = res[:n_lifetimes]
-        lfit_params[:, i] = np.asarray(amplitudes)
+        res, _ = optimize.curve_fit(multi_exp, ts_for_fit, data[after, i], p0=guesses, bounds=fit_bounds)
+        lfit_params[:, i] = res[:n_lifetimes]
     return lfit_params
 
 
@@ -298,6 +331,7 @@ def amp_arr_from_list(params, n_lifetimes, n_wls):
 def global_fit(data, ts, fit_after, lfits, bounded_lifetimes):
     """Do a global fit of the data using local fits as the starting point.
     """
+    from scipy import optimize
     n_lifetimes = len(bounded_lifetimes)
     n_wls = data.shape[1]
     gfit_guesses = make_gfit_guesses(lfits, bounded_lifetimes)
@@ -305,14 +339,11 @@ def global_fit(data, ts, fit_after, lfits, bounded_lifetimes):
     ts_for_fit = ts[ts > fit_after]
 
     def compute_residuals(params, *args):
-        fitted = np.empty_like(data_for_fit)
-        amp_arr = amp_arr_from_list(params, n_lifetimes, n_wls)
-        gfit_lifetimes = list(params[-n_lifetimes:])
-        for i in range(n_wls):
-            amps = list(amp_arr[:, i])
-            exp_args = amps + gfit_lifetimes
-            fitted[:, i] = multi_exp(ts_for_fit, *exp_args)
-        diff = data_for_fit - fitted
+        amp_arr = np.reshape(params[:-n_lifetimes], (n_lifetimes, n_wls))
+        gfit_lifetimes = params[-n_lifetimes:]
+        # Each column is one exponential, so every fitted curve is a weighted sum of the columns
+        exps = np.exp(-ts_for_fit[:, np.newaxis] / gfit_lifetimes[np.newaxis, :])
+        diff = data_for_fit - exps @ amp_arr
         return diff.reshape(data_for_fit.shape[0] * data_for_fit.shape[1])
 
     res = optimize.least_squares(compute_residuals, x0=gfit_guesses, method="lm", verbose=2)
@@ -399,20 +430,19 @@ def save_double_fit_spectra(output_dir, amps, lifetimes, da_wls, cd_wls):
 
 def fixed_lifetime_global_fit(data, ts, fit_after, lfits, lifetimes):
     """Do a global fit with the lifetimes fixed."""
+    from scipy import optimize
     n_lifetimes = len(lifetimes)
     n_wls = data.shape[1]
     amp_guesses = np.reshape(lfits, (lfits.size,), order="F")
     data_for_fit = data[ts > fit_after, :]
     ts_for_fit = ts[ts > fit_after]
 
+    # The lifetimes are fixed, so the exponentials only need to be computed once
+    exps = np.exp(-ts_for_fit[:, np.newaxis] / np.asarray(lifetimes)[np.newaxis, :])
+
     def compute_residuals(params, *args):
-        fitted = np.empty_like(data_for_fit)
-        amp_arr = amp_arr_from_list(params, n_lifetimes, n_wls)
-        for i in range(n_wls):
-            amps = list(amp_arr[:, i])
-            exp_args = amps + lifetimes
-            fitted[:, i] = multi_exp(ts_for_fit, *exp_args)
-        diff = data_for_fit - fitted
+        amp_arr = np.reshape(params, (n_lifetimes, n_wls))
+        diff = data_for_fit - exps @ amp_arr
         return diff.reshape(data_for_fit.shape[0] * data_for_fit.shape[1])
 
     res = optimize.least_squares(compute_residuals, x0=amp_guesses, method="lm", verbose=2)
@@ -1,7 +1,10 @@
+import functools
 import itertools
+import os
 import click
+import h5py
 import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
 from typing import Union, List, Tuple
@@ -21,6 +24,19 @@ CHANNEL_MAP = {
 
 POINTS = 20_000
 VALENTYN_POINTS = 50_000
+CHUNK_BYTES = 1_048_576
+CHUNK_CACHE_BYTES = 64 * 1024 * 1024
+# A prime a couple of orders of magnitude larger than the number of chunks that fit in the cache
+CHUNK_CACHE_SLOTS = 10_007
+RAW_CHUNK_SHOTS = 32
+# LZF ships with h5py, so compressed files don't need any HDF5 plugins to be read
+COMPRESSION = {"compression": "lzf", "shuffle": True}
+
+
+def open_data_file(path, mode="r") -> h5py.File:
+    """Open an HDF5 data file with a chunk cache large enough for the chunked datasets.
+    """
+    return h5py.File(path, mode, rdcc_nbytes=CHUNK_CACHE_BYTES, rdcc_nslots=CHUNK_CACHE_SLOTS)
 
 
 def valid_channel(channel_str) -> bool:
@@ -42,19 +58,65 @@ def count_subdirs(path) -> int:
 
     This is useful for determining the number of wavelengths and shots in an experiment.
     """
-    count = 0
-    for item in path.iterdir():
-        if item.is_dir():
-            if item.name[0] == "_":
-                continue
-            count += 1
-    return count
+    with os.scandir(path) as entries:
+        return sum(1 for e in entries if e.is_dir() and e.name[0] != "_")
+
+
+def txt_files(d) -> List[Path]:
+    """Return the sorted paths of the CSV files directly under `d`.
+
+    This uses `os.scandir`, which avoids building a `Path` for every entry in the directory.
+    """
+    with os.scandir(d) as entries:
+        names = sorted(e.name for e in entries if e.name.endswith(".txt"))
+    return [Path(d) / name for name in names]
+
+
+def load_txt(path, usecols=None) -> np.ndarray:
+    """Load a CSV file of dA or dCD data.
+
+    This uses the C parser from pandas, which is much faster than `np.loadtxt`. The
+    round-trip float parser is used so that values are read back exactly as written.
+    """
+    # pandas takes a while to import and the HDF5-only commands never read CSVs
+    import pandas as pd
+    df = pd.read_csv(path, header=None, usecols=usecols, dtype=np.float64, engine="c",
+                     float_precision="round_trip")
+    return df.to_numpy(copy=True)
+
+
+def load_columns_into_arr(files, arr, offset=0) -> None:
+    """Load the second column of each CSV file into consecutive columns of `arr`.
+
+    The files are read concurrently, which works well with threads since the pandas
+    parser releases the GIL. The first file is stored in column `offset`. `arr` should
+    be in Fortran order so that each thread writes to its own contiguous column.
+    """
+    def load_column(i, f):
+        arr[:, i + offset] = load_txt(f, usecols=[1])[:, 0]
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        list(ex.map(load_column, range(len(files)), files))
 
 
 def save_txt(arr, path) -> None:
     """Save a CSV file of dA or dCD data.
+
+    The output has the same format as `np.savetxt`, but is written by pandas, which
+    doesn't format each row in Python.
+    """
+    import pandas as pd
+    pd.DataFrame(arr).to_csv(path, header=False, index=False, float_format="%.18e", na_rep="nan")
+
+
+def save_xy_txt(x, y, path) -> None:
+    """Save a two-column CSV file from separate x and y arrays.
+
+    This is the same as `save_txt`, but doesn't require assembling the columns into
+    a single array first. Integer x-values (e.g. shot numbers) are written as integers.
     """
-    np.savetxt(path, arr, delimiter=",")
+    import pandas as pd
+    pd.DataFrame({0: x, 1: y}).to_csv(path, header=False, index=False, float_format="%.18e", na_rep="nan")
 
 
 def save_fig(x, y, path, xlabel=None, ylabel=None, title=None, remove_dev=False) -> None:
@@ -70,6 +132,8 @@ def save_fig(x, y, path, xlabel=None, ylabel=None, title=None, remove_dev=False)
         for i in range(len(y)):
             if devs[i] > 2:
                 y[i] = (y[i - 2] + y[i + 2]) / 2
+    # pyplot takes a while to import and most commands don't make figures
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(figsize=(5, 3))
     ax.plot(x, y, linewidth=0.5)
     if xlabel:
@@ -83,24 +147,31 @@ def save_fig(x, y, path, xlabel=None, ylabel=None, title=None, remove_dev=False)
     plt.close()
 
 
+@functools.lru_cache(maxsize=8)
 def time_axis(tpp=20e-9, length=20_000) -> np.ndarray:
     """Return the time axis used in experiments.
+
+    The result is cached and shared between callers, so it is read-only. Make a copy
+    if you need to modify it.
     """
     ts = tpp * np.arange(length)
     ten_percent_point = np.floor(length / 10) * tpp
     ts -= ten_percent_point
     ts *= 1e6  # convert from seconds to microseconds
+    ts.setflags(write=False)
     return ts
 
 
 def index_for_wavelength(wls, w) -> Union[None, int]:
     """Return the index for a particular wavelength or None if not present
+
+    `wls` should be an array (e.g. `infile["wavelengths"][:]`) rather than an HDF5 dataset
+    so that the comparison isn't done one element at a time.
     """
-    try:
-        idx = wls.index(w)
-    except ValueError:
+    matches = np.flatnonzero(np.asarray(wls) == w)
+    if matches.size == 0:
         return None
-    return idx
+    return int(matches[0])
 
 
 def iter_chunks(iterable, size):
@@ -134,12 +205,61 @@ def compute_splits(points, size) -> List[Tuple[int, int]]:
     return splits
 
 
-def load_dir_into_arr(d: Path) -> (np.ndarray, np.ndarray):
+def da_chunk_shape(points, shots, wavelengths, itemsize=4) -> Tuple[int, int, int]:
+    """Compute a chunk shape of roughly 1MB for a dA or dCD dataset.
+
+    Each chunk spans the whole time axis and every wavelength, so that reading a
+    contiguous range of shots (e.g. when averaging or splitting) only touches whole chunks.
+    """
+    chunk_shots = max(1, CHUNK_BYTES // (points * wavelengths * itemsize))
+    return points, min(chunk_shots, shots), wavelengths
+
+
+def raw_chunk_shape(points, shots) -> Tuple[int, int, int, int, int]:
+    """Compute the chunk shape for a raw dataset.
+
+    Each chunk holds every point and channel for a block of shots at a single wavelength
+    and pump state, which is how the raw data is written and sliced.
+    """
+    return points, 3, min(RAW_CHUNK_SHOTS, shots), 1, 1
+
+
+def shot_block_size(ds) -> int:
+    """The number of shots to read or write at a time when streaming a dA or dCD dataset.
+
+    Blocks are a whole number of chunks along the shot axis and about the size of the chunk cache.
+    """
+    points, shots, wavelengths = ds.shape
+    chunk_shots = ds.chunks[1] if ds.chunks is not None else 1
+    shot_bytes = points * wavelengths * ds.dtype.itemsize
+    return max(1, CHUNK_CACHE_BYTES // (shot_bytes * chunk_shots)) * chunk_shots
+
+
+def shot_block_reduce(ds, func) -> np.ndarray:
+    """Apply a per-shot reduction to a dA or dCD dataset one block of shots at a time.
+
+    `func` takes a (points, shots, wavelengths) array and returns a (shots, wavelengths) array,
+    so only one block of the dataset is in memory at a time.
+    """
+    points, shots, wavelengths = ds.shape
+    block_shots = shot_block_size(ds)
+    out = np.empty((shots, wavelengths))
+    tmp = np.empty((points, min(block_shots, shots), wavelengths), dtype=ds.dtype)
+    for start, stop in compute_splits(shots, block_shots):
+        n = stop - start
+        ds.read_direct(tmp, source_sel=np.s_[:, start:stop, :], dest_sel=np.s_[:, :n, :])
+        out[start:stop, :] = func(tmp[:, :n, :])
+    return out
+
+
+def load_dir_into_arr(d: Path) -> (np.ndarray, np.ndarray, List[Path]):
     """Load the text files in the given directory into an array.
+
+    The sorted list of files is returned along with the data and the x-values so that
+    callers don't need to scan the directory again (e.g. to get the wavelengths).
     """
-    files = sorted([f for f in d.iterdir() if f.suffix == ".txt"])
-    first = np.loadtxt(files[0], delimiter=",")
-    arr = np.empty((first.shape[0], len(files)))
-    for i, f in enumerate(files):
-        arr[:, i] = np.loadtxt(f, delimiter=",")[:, 1]
-    return arr, first[:, 0]
+    files = txt_files(d)
+    first = load_txt(files[0])
+    arr = np.empty((first.shape[0], len(files)), order="F")
+    load_columns_into_arr(files, arr)
+    return arr, first[:, 0], files
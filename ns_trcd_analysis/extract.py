@@ -3,15 +3,17 @@ import numpy as np
 from . import core
 
 
-def save_avg_as_txt(f, outdir, ds_name="average"):
+def save_avg_as_txt(f, outdir, ds_name="average", data=None):
     """Save the average dA for each wavelength as a CSV file.
+
+    If `data` is provided it is used instead of reading `ds_name` from the file.
     """
-    da = f[ds_name]
+    da = f[ds_name] if data is None else data
     points, wls = da.shape
     ts = core.time_axis(length=points)
     outdata = np.empty((points, 2))
     outdata[:, 0] = ts
-    wavelengths = f["wavelengths"]
+    wavelengths = f["wavelengths"][:]
     if not outdir.exists():
         outdir.mkdir()
     with click.progressbar(range(wls), label="Saving CSVs") as indices:
@@ -40,15 +42,17 @@ def save_avg_as_png(f, outdir, xlabel=None, ylabel=None, title=None):
     return
 
 
-def save_avg_da_figures(f, outdir, ds_name="average"):
+def save_avg_da_figures(f, outdir, ds_name="average", data=None):
     """Save the average dA for each wavelength as a PNG file.
+
+    If `data` is provided it is used instead of reading `ds_name` from the file.
     """
-    da = f[ds_name]
+    da = f[ds_name] if data is None else data
     points, wls = da.shape
     ts = core.time_axis(length=points)
     outdata = np.empty((points, 2))
     outdata[:, 0] = ts
-    wavelengths = f["wavelengths"]
+    wavelengths = f["wavelengths"][:]
     if not outdir.exists():
         outdir.mkdir()
     with click.progressbar(range(wls), label="Saving figures") as indices:
@@ -59,15 +63,17 @@ def save_avg_da_figures(f, outdir, ds_name="average"):
     return
 
 
-def save_avg_cd_figures(f, outdir, ds_name="average"):
+def save_avg_cd_figures(f, outdir, ds_name="average", data=None):
     """Save the average dA for each wavelength as a PNG file.
+
+    If `data` is provided it is used instead of reading `ds_name` from the file.
     """
-    cd = f[ds_name]
+    cd = f[ds_name] if data is None else data
     points, wls = cd.shape
     ts = core.time_axis(length=points)
     outdata = np.empty((points, 2))
     outdata[:, 0] = ts
-    wavelengths = f["wavelengths"]
+    wavelengths = f["wavelengths"][:]
     if not outdir.exists():
         outdir.mkdir()
     with click.progressbar(range(wls), label="Saving figures") as indices:
@@ -100,13 +106,13 @@ def save_da_shots_as_txt(outdir, ds, wl_idx):
         outdir.mkdir()
     points, shots, wavelengths = ds.shape
     ts = core.time_axis(length=points)
-    tmp = np.empty((points, shots, wavelengths))
-    ds.read_direct(tmp)
+    tmp = np.empty((points, shots))
+    ds.read_direct(tmp, np.s_[:, :, wl_idx])
     with click.progressbar(range(shots), label="Saving CSVs") as indices:
         for shot_idx in indices:
             save_data = np.empty((points, 2))
             save_data[:, 0] = ts
-            save_data[:, 1] = tmp[:, shot_idx, wl_idx]
+            save_data[:, 1] = tmp[:, shot_idx]
             filename = f"{shot_idx+1:03d}.txt"
             filepath = outdir / filename
             np.savetxt(filepath, save_data, delimiter=",")
@@ -120,13 +126,13 @@ def save_raw_shots_as_txt(outdir, ds, wl_idx, chan, pump_idx):
         outdir.mkdir()
     points, _, shots, wavelengths, _ = ds.shape
     ts = core.time_axis(length=points)
-    tmp = np.empty((points, 3, shots, wavelengths, 2))
-    ds.read_direct(tmp)
+    tmp = np.empty((points, shots))
+    ds.read_direct(tmp, np.s_[:, chan.value, :, wl_idx, pump_idx])
     with click.progressbar(range(shots), label="Saving CSVs") as indices:
         for shot_idx in indices:
             save_data = np.empty((points, 2))
             save_data[:, 0] = ts
-            save_data[:, 1] = tmp[:, chan.value, shot_idx, wl_idx, pump_idx]
+            save_data[:, 1] = tmp[:, shot_idx]
             filename = f"{shot_idx+1:03d}.txt"
             filepath = outdir / filename
             np.savetxt(filepath, save_data, delimiter=",")
@@ -11,12 +11,14 @@ def dump_raw_images(path, channel, arr, wl_idx, pump_idx) -> None:
         click.echo(f"Incorrect data format: {len(arr.shape)} dimensions when 5 are expected.", err=True)
         return
     ts = core.time_axis(length=points)
+    # Read every shot at once rather than one shot per figure
+    block = arr[:, channel.value, :, wl_idx, pump_idx]
     if not path.exists():
         path.mkdir()
     with click.progressbar(range(num_shots), label="Generating images") as shots:
         for shot_num in shots:
             outfile = path / f"{shot_num+1:03d}.png"
-            core.save_fig(ts, arr[:, channel.value, shot_num, wl_idx, pump_idx], outfile)
+            core.save_fig(ts, block[:, shot_num], outfile)
     return
 
 
@@ -29,10 +31,12 @@ def dump_da_images(path, arr, wl_idx) -> None:
         click.echo(f"Incorrect data format: {len(arr.shape)} dimensions when 3 are expected.", err=True)
         return
     ts = core.time_axis(length=points)
+    # Read every shot at once rather than one shot per figure
+    block = arr[:, :, wl_idx]
     if not path.exists():
         path.mkdir()
     with click.progressbar(range(num_shots), label="Generating images") as shots:
         for shot_num in shots:
             outfile = path / f"{shot_num+1:03d}.png"
-            core.save_fig(ts, arr[:, shot_num, wl_idx], outfile)
+            core.save_fig(ts, block[:, shot_num], outfile)
     return
@@ -1,10 +1,6 @@
 import click
-import h5py
 import numpy as np
-import json
 from pathlib import Path
-from scipy.optimize import minimize_scalar
-from scipy.signal import savgol_filter
 from . import core
 from . import compute
 from . import extract
@@ -66,11 +62,13 @@ def da(input_file, output_file, average, subtract_background, fig, txt, perp):
     The output is stored in a separate file (OUTPUT_FILE) with the shape (points, shots, wavelengths).
     """
     click.echo("Loading file...")
-    with h5py.File(output_file, "w") as outfile:
-        with h5py.File(input_file, "r") as infile:
+    with core.open_data_file(output_file, "w") as outfile:
+        with core.open_data_file(input_file) as infile:
             (points, _, shots, wavelengths, pump_states) = infile["data"].shape
             without_pump = (pump_states == 2)
-            outfile.create_dataset("data", (points, shots, wavelengths))
+            chunks = core.da_chunk_shape(points, shots, wavelengths, itemsize=np.dtype(np.float32).itemsize)
+            outfile.create_dataset("data", (points, shots, wavelengths), dtype=np.float32, chunks=chunks,
+                                   **core.COMPRESSION)
             outfile.create_dataset("wavelengths", (wavelengths,), data=infile["wavelengths"])
             if perp:
                 compute.compute_perp_da(infile, outfile)
@@ -79,14 +77,17 @@ def da(input_file, output_file, average, subtract_background, fig, txt, perp):
                     compute.compute_da_with_and_without_pump(infile, outfile)
                 else:
                     compute.compute_da_always_pumped(infile, outfile)
-            if subtract_background:
+            if subtract_background and average:
+                avg = compute.subtract_background_and_average(outfile)
+            elif subtract_background:
                 compute.subtract_background(outfile)
+            elif average:
+                avg = compute.average(outfile)
             if average:
-                compute.average(outfile)
                 if txt:
-                    extract.save_avg_as_txt(outfile, Path(txt))
+                    extract.save_avg_as_txt(outfile, Path(txt), data=avg)
                 if fig:
-                    extract.save_avg_da_figures(outfile, Path(fig))
+                    extract.save_avg_da_figures(outfile, Path(fig), data=avg)
             else:
                 if txt:
                     click.echo("Saving a CSV requires averaging. See the '-a' option.", err=True)
@@ -111,24 +112,29 @@ def cd(input_file, output_file, delta, average, subtract_background, fig, txt):
     The output is stored in a separate file (OUTPUT_FILE) with the shape (points, shots, wavelengths).
     """
     click.echo("Loading file...")
-    with h5py.File(output_file, "w") as outfile:
-        with h5py.File(input_file, "r") as infile:
+    with core.open_data_file(output_file, "w") as outfile:
+        with core.open_data_file(input_file) as infile:
             (points, _, shots, wavelengths, pump_states) = infile["data"].shape
             without_pump = (pump_states == 2)
-            outfile.create_dataset("data", (points, shots, wavelengths))
+            chunks = core.da_chunk_shape(points, shots, wavelengths, itemsize=np.dtype(np.float32).itemsize)
+            outfile.create_dataset("data", (points, shots, wavelengths), dtype=np.float32, chunks=chunks,
+                                   **core.COMPRESSION)
             outfile.create_dataset("wavelengths", (wavelengths,), data=infile["wavelengths"])
             if without_pump:
                 compute.compute_cd_with_and_without_pump(infile, outfile, delta)
             else:
                 compute.compute_cd_always_pumped(infile, outfile, delta)
-            if subtract_background:
+            if subtract_background and average:
+                avg = compute.subtract_background_and_average(outfile)
+            elif subtract_background:
                 compute.subtract_background(outfile)
+            elif average:
+                avg = compute.average(outfile)
             if average:
-                compute.average(outfile)
                 if txt:
-                    extract.save_avg_as_txt(outfile, Path(txt))
+                    extract.save_avg_as_txt(outfile, Path(txt), data=avg)
                 if fig:
-                    extract.save_avg_cd_figures(outfile, Path(fig))
+                    extract.save_avg_cd_figures(outfile, Path(fig), data=avg)
             else:
                 if txt:
                     click.echo("Saving a CSV requires averaging. See the '-a' option.", err=True)
@@ -162,7 +168,7 @@ def export(input_file, fig, txt, format, channel, wavelength, without_pump, aver
     if data_options.count(True) > 1:
         click.echo("Please choose at most one of '--averaged', '--osc-free', or '--collapsed'.")
         return
-    with h5py.File(input_file, "r") as infile:
+    with core.open_data_file(input_file) as infile:
         if averaged:
             try:
                 _ = infile["average"]
@@ -201,7 +207,7 @@ def export(input_file, fig, txt, format, channel, wavelength, without_pump, aver
             if not wavelength:
                 click.echo("Please choose a wavelength.")
                 return
-            wl_idx = core.index_for_wavelength(list(infile["wavelengths"]), int(wavelength * 100))
+            wl_idx = core.index_for_wavelength(infile["wavelengths"][:], int(wavelength * 100))
             if wl_idx is None:
                 click.echo("Wavelength not found.")
                 return
@@ -245,20 +251,31 @@ def split(input_file, size):
     input_file_path = Path(input_file)
     parent_path = input_file_path.parent
     input_file_stem = input_file_path.stem
-    with h5py.File(input_file, "r") as infile:
-        points, shots, wavelengths = infile["data"].shape
-        original = np.empty((points, shots, wavelengths))
-        infile["data"].read_direct(original)
+    with core.open_data_file(input_file) as infile:
+        in_ds = infile["data"]
+        points, shots, wavelengths = in_ds.shape
         splits = core.compute_splits(shots, size)
+        # A single buffer is reused for every block of every split
+        tmp_ds = None
         for i, (start, stop) in enumerate(splits):
             split_file = parent_path / (input_file_stem + f"_split{i}.h5")
             if split_file.exists():
                 click.echo("A split file with a conflicting name already exists.")
                 return
-            with h5py.File(split_file, "w") as outfile:
-                tmp_ds = original[:, start:stop, :]
+            split_shots = stop - start
+            with core.open_data_file(split_file, "w") as outfile:
                 outfile.copy(infile["wavelengths"], "wavelengths")
-                outfile.create_dataset("data", data=tmp_ds)
+                chunks = core.da_chunk_shape(points, split_shots, wavelengths, itemsize=in_ds.dtype.itemsize)
+                out_ds = outfile.create_dataset("data", (points, split_shots, wavelengths), dtype=in_ds.dtype, chunks=chunks,
+                                                **core.COMPRESSION)
+                # Copy the split in blocks of whole chunks so that only one block is ever in memory
+                block_shots = min(split_shots, core.shot_block_size(out_ds))
+                if (tmp_ds is None) or (tmp_ds.shape[1] < block_shots):
+                    tmp_ds = np.empty((points, block_shots, wavelengths), dtype=in_ds.dtype)
+                for block_start, block_stop in core.compute_splits(split_shots, block_shots):
+                    n = block_stop - block_start
+                    in_ds.read_direct(tmp_ds, source_sel=np.s_[:, start + block_start:start + block_stop, :], dest_sel=np.s_[:, :n, :])
+                    out_ds.write_direct(tmp_ds, source_sel=np.s_[:, :n, :], dest_sel=np.s_[:, block_start:block_stop, :])
     return
 
 
@@ -269,12 +286,12 @@ def split(input_file, size):
 def average(input_file, fig, txt):
     """Average the data contained in a dA or dCD file.
     """
-    with h5py.File(input_file, "r+") as file:
-        compute.average(file)
+    with core.open_data_file(input_file, "r+") as file:
+        avg = compute.average(file)
         if txt:
-            extract.save_avg_as_txt(file, Path(txt))
+            extract.save_avg_as_txt(file, Path(txt), data=avg)
         if fig:
-            extract.save_avg_da_figures(file, Path(fig))
+            extract.save_avg_da_figures(file, Path(fig), data=avg)
     return
 
 
@@ -286,38 +303,40 @@ def average(input_file, fig, txt):
 def rmosc(input_dir, output_dir, after, whole_curve):
     """Remove oscillations from averaged dCD data.
     """
+    from scipy.signal import savgol_filter
     input_dir = Path(input_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
-    files = sorted([f for f in input_dir.iterdir() if f.suffix == ".txt"])
+    files = core.txt_files(input_dir)
     if "85000" not in [f.stem for f in files]:
         click.echo("Data does not contain an 850nm curve.", err=True)
         return
-    ts = np.loadtxt(files[0], delimiter=",")[:, 0]
+    ts = core.time_axis()
+    # The time axis is sorted, so the points after `after` are a contiguous slice
+    after_idx = int(np.searchsorted(ts, after, side="right"))
     wavelengths = [int(f.stem) for f in files]
     osc_index = wavelengths.index(85000)
-    osc_raw = np.loadtxt(files[osc_index], delimiter=",")[:, 1]
-    osc_smoothed = osc_raw
-    osc_smoothed[ts > after] = savgol_filter(osc_raw[ts > after], 11, 3)
-    ts = core.time_axis()
+    osc_smoothed = core.load_txt(files[osc_index], usecols=[1])[:, 0]
+    osc_smoothed[after_idx:] = savgol_filter(osc_smoothed[after_idx:], 11, 3)
+    # The scale factor that minimizes the std. dev. of (original - x * osc) is cov(original, osc) / var(osc),
+    # so everything that depends only on the oscillation curve can be computed up front. Since the centered
+    # oscillation sums to zero, the original curve doesn't need to be centered as well.
+    osc_after = osc_smoothed[after_idx:]
+    osc_centered = osc_after - osc_after.mean()
+    osc_var = osc_centered @ osc_centered
+    scaled_osc = np.zeros_like(osc_smoothed)
+    if whole_curve:
+        scaled_osc[:after_idx] = osc_smoothed[:after_idx]
+    osc_free = np.empty_like(osc_smoothed)
     with click.progressbar(files, label="Removing oscillations") as files_iter:
         for i, f in enumerate(files_iter):
-            original = np.loadtxt(f, delimiter=",")[:, 1]
-
-            def minimize_me(x):
-                return np.std(original[ts > after] - x * osc_smoothed[ts > after])
-
-            res = minimize_scalar(minimize_me)
-            scaled_osc = osc_smoothed
-            scaled_osc[ts > after] = res.x * osc_smoothed[ts > after]
-            if not whole_curve:
-                scaled_osc[ts <= after] *= 0
-            osc_free = original - scaled_osc
-            out_data = np.empty((len(ts), 2))
-            out_data[:, 0] = ts
-            out_data[:, 1] = osc_free
+            original = core.load_txt(f, usecols=[1])[:, 0]
+            original_after = original[after_idx:]
+            scale = (original_after @ osc_centered) / osc_var
+            np.multiply(osc_after, scale, out=scaled_osc[after_idx:])
+            np.subtract(original, scaled_osc, out=osc_free)
             output_file = output_dir / f.name
-            np.savetxt(output_file, out_data, delimiter=",")
+            core.save_xy_txt(ts, osc_free, output_file)
     return
 
 
@@ -331,7 +350,7 @@ def rmosc(input_dir, output_dir, after, whole_curve):
 def rmoffset(input_file, points, each, average, osc_free, collapsed):
     """Shift curves up or down such that the values before the pump are centered on zero.
     """
-    with h5py.File(input_file, "r+") as file:
+    with core.open_data_file(input_file, "r+") as file:
         if len(file["data"].shape) != 3:
             click.echo("File does not contain valid dA or dCD data (wrong dimensions).")
             return
@@ -370,8 +389,7 @@ def rmoffset(input_file, points, each, average, osc_free, collapsed):
 @click.option("--instr-spec", required=True, type=click.INT, help="The spectrum that holds the instrument function.")
 def gfitfile(input_dir, output_file, lifetimes, input_spec, output_spec, instr_spec):
     indir = Path(input_dir)
-    task_names = [f.stem for f in indir.iterdir() if f.suffix == ".txt"]
-    task_names = sorted(task_names)
+    task_names = [f.stem for f in core.txt_files(indir)]
     amplitudes = [1 for _ in range(len(lifetimes))]
     outfile = Path(output_file)
     contents = ssolve_gfit.global_fit_file(task_names, lifetimes, amplitudes, input_spec, output_spec, instr_spec)
@@ -390,7 +408,7 @@ def importscript(input_dir, output_file):
     """
     input_dir = Path(input_dir)
     outfile = Path(output_file)
-    files = sorted([f for f in input_dir.iterdir() if f.suffix == ".txt"])
+    files = core.txt_files(input_dir)
     if len(files) == 0:
         click.echo("No valid files found in specified directory.")
         return
@@ -405,14 +423,14 @@ def tshift(input_dir, time_shift):
     """Shift the time axis of data files in the specified directory.
     """
     input_dir = Path(input_dir)
-    files = [f for f in input_dir.iterdir() if f.suffix == ".txt"]
+    files = core.txt_files(input_dir)
     if len(files) == 0:
         click.echo("No valid files found in specified directory.")
         return
     for f in files:
-        data = np.loadtxt(f, delimiter=",")
+        data = core.load_txt(f)
         data[:, 0] += time_shift
-        np.savetxt(f, data, delimiter=",")
+        core.save_txt(data, f)
     return
 
 
@@ -429,7 +447,7 @@ def collapse(input_dir, output_dir, times, cpoints):
         return
     input_dir = Path(input_dir)
     output_dir = Path(output_dir)
-    files = [f for f in input_dir.iterdir() if f.suffix == ".txt"]
+    files = core.txt_files(input_dir)
     filenames = [f.name for f in files]
     ts = core.time_axis()
     for t in times:
@@ -441,20 +459,15 @@ def collapse(input_dir, output_dir, times, cpoints):
             return
     num_points = core.POINTS
     num_wls = len(files)
-    data_with_time = np.empty((num_points, num_wls + 1))
+    data_with_time = np.empty((num_points, num_wls + 1), order="F")
     data_with_time[:, 0] = ts
-    for i, f in enumerate(files, start=1):
-        data = np.loadtxt(f, delimiter=",")[:, 1]
-        data_with_time[:, i] = data
+    core.load_columns_into_arr(files, data_with_time, offset=1)
     collapsed_data = compute.collapse(data_with_time, times, cpoints)
     collapsed_time = collapsed_data[:, 0]
     output_dir.mkdir(exist_ok=True)
     for i, f in enumerate(filenames, start=1):
-        data = np.empty((len(collapsed_time), 2))
-        data[:, 0] = collapsed_time
-        data[:, 1] = collapsed_data[:, i]
         output_file = output_dir / f
-        np.savetxt(output_file, data, delimiter=",")
+        core.save_xy_txt(collapsed_time, collapsed_data[:, i], output_file)
     return
 
 
@@ -470,21 +483,22 @@ def collapse(input_dir, output_dir, times, cpoints):
 def shotslice(input_file, data_format, channel, figpath, txtpath, stime, sindex, wavelength):
     """Select the same point in time for every shot in the dataset at a fixed wavelength.
     """
-    with h5py.File(input_file, "r") as infile:
+    with core.open_data_file(input_file) as infile:
         if (txtpath is None) and (figpath is None):
             click.echo("No output has been chosen. See '-f' or '-t'.", err=True)
             return
         points = infile["data"].shape[0]
         if not slices.valid_shot_slice_point(stime, sindex, points):
             return
+        ts = core.time_axis()
         if sindex is None:
-            s_idx = slices.index_nearest_to_value(core.time_axis(), stime)
+            s_idx = slices.index_nearest_to_value(ts, stime)
             if s_idx is None:
                 click.echo("Slice time is out of range.")
                 return
         else:
             s_idx = sindex
-        wl_idx = core.index_for_wavelength(list(infile["wavelengths"]), wavelength)
+        wl_idx = core.index_for_wavelength(infile["wavelengths"][:], wavelength)
         if wl_idx is None:
             click.echo("Wavelength not found.")
             return
@@ -500,12 +514,9 @@ def shotslice(input_file, data_format, channel, figpath, txtpath, stime, sindex,
             s = infile["data"][s_idx, :, wl_idx]
         shots = np.arange(len(s))
         if txtpath:
-            txtdata = np.empty((len(shots), 2))
-            txtdata[:, 0] = shots
-            txtdata[:, 1] = s
-            core.save_txt(txtdata, txtpath)
+            core.save_xy_txt(shots, s, txtpath)
         if figpath:
-            t = core.time_axis()[s_idx]
+            t = ts[s_idx]
             core.save_fig(shots, s, figpath, xlabel="Shot Number", title=f"{wavelength}nm, t={t:.2f}us")
     return
 
@@ -533,7 +544,7 @@ def wlslice(input_file, input_dir, fig, txt, stime, sindex, averaged, osc_free,
         if data_options.count(True) != 1:
             click.echo("Choose a data source using '--averaged', '--osc-free', or '--collapsed'.")
             return
-        with h5py.File(input_file, "r") as infile:
+        with core.open_data_file(input_file) as infile:
             if averaged:
                 try:
                     data = infile["average"]
@@ -552,17 +563,16 @@ def wlslice(input_file, input_dir, fig, txt, stime, sindex, averaged, osc_free,
                 except KeyError:
                     click.echo("File does not contain collapsed data.")
                     return
-            wavelengths = [x / 100 for x in infile["wavelengths"]]
+            wavelengths = infile["wavelengths"][:] / 100
             points = data.shape[0]
     elif input_dir:
         input_dir = Path(input_dir)
-        files = [f for f in input_dir.iterdir() if f.suffix == ".txt"]
-        first_file = np.loadtxt(files[0], delimiter=",")
+        files = core.txt_files(input_dir)
+        first_file = core.load_txt(files[0])
         points = first_file.shape[0]
         wavelengths = [int(f.stem) for f in files]
-        data = np.empty((points, len(files)))
-        for i, f in enumerate(files):
-            data[:, i] = np.loadtxt(f, delimiter=",")[:, 1]
+        data = np.empty((points, len(files)), order="F")
+        core.load_columns_into_arr(files, data)
     else:
         click.echo("Choose an input source with --input-file or --input-dir", err=True)
         return
@@ -584,10 +594,7 @@ def wlslice(input_file, input_dir, fig, txt, stime, sindex, averaged, osc_free,
     else:
         slice_data = data[s_idx, :]
     if txt:
-        txtdata = np.empty((len(wavelengths), 2))
-        txtdata[:, 0] = wavelengths
-        txtdata[:, 1] = slice_data
-        core.save_txt(txtdata, Path(txt))
+        core.save_xy_txt(wavelengths, slice_data, Path(txt))
     if fig:
         t = ts[s_idx]
         core.save_fig(wavelengths, slice_data * 1_000, fig, xlabel="Wavelength",
@@ -607,7 +614,7 @@ def absslice(input_file, figpath, txtpath, stime, sindex, wavelength):
 
     Note: This command is only valid for raw data.
     """
-    with h5py.File(input_file, "r") as infile:
+    with core.open_data_file(input_file) as infile:
         if len(infile["data"].shape) != 5:
             click.echo("This command only works with raw data. (Incorrect number of dimensions).")
             return
@@ -617,26 +624,24 @@ def absslice(input_file, figpath, txtpath, stime, sindex, wavelength):
         points = infile["data"].shape[0]
         if not slices.valid_shot_slice_point(stime, sindex, points):
             return
+        ts = core.time_axis()
         if sindex is None:
-            s_idx = slices.index_nearest_to_value(core.time_axis(), stime)
+            s_idx = slices.index_nearest_to_value(ts, stime)
             if s_idx is None:
                 click.echo("Slice time is out of range.")
                 return
         else:
             s_idx = sindex
-        wl_idx = core.index_for_wavelength(list(infile["wavelengths"]), wavelength)
+        wl_idx = core.index_for_wavelength(infile["wavelengths"][:], wavelength)
         if wl_idx is None:
             click.echo("Wavelength not found.")
             return
         s = slices.abs_slice_at_index(infile, s_idx, wl_idx)
         shots = np.arange(len(s))
         if txtpath:
-            txtdata = np.empty((len(shots), 2))
-            txtdata[:, 0] = shots
-            txtdata[:, 1] = s
-            core.save_txt(txtdata, txtpath)
+            core.save_xy_txt(shots, s, txtpath)
         if figpath:
-            t = core.time_axis()[s_idx]
+            t = ts[s_idx]
             core.save_fig(shots, s, figpath, xlabel="Shot number", ylabel="Abs.",
                           title=f"Slice at {wavelength}nm, t={t:.2f}us")
         return
@@ -651,15 +656,13 @@ def sigma_filter(data_file, filter_file, scale):
     """
     data_file = Path(data_file)
     filter_file = Path(filter_file)
-    with h5py.File(data_file, "r") as f:
-        data = np.empty_like(f["data"])
-        f["data"].read_direct(data, np.s_[:, :, :], np.s_[:, :, :])
-    filtered = noise.reject_sigma(data, scale)
+    with core.open_data_file(data_file) as infile:
+        stddevs = core.shot_block_reduce(infile["data"], noise.shot_stddevs)
+    filtered = noise.reject_sigma(stddevs, scale)
     if filter_file.exists():
         old_filtered = noise.load_filter_list(filter_file)
         filtered = noise.merge_filter_lists(filtered, old_filtered)
-    with filter_file.open("w") as f:
-        json.dump(filtered, f)
+    noise.save_filter_list(filter_file, filtered)
 
 
 @click.command()
@@ -676,8 +679,8 @@ def global_fit(input_dir, output_dir, save_gfit_curves, save_lfit_curves, lifeti
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
     bounded_lifetimes = compute.bounded_lifetimes_from_args(lifetimes)
-    data, ts = load_dir_into_arr(input_dir)
-    wls = [int(f.stem) for f in sorted(input_dir.iterdir()) if f.suffix == ".txt"]
+    data, ts, files = load_dir_into_arr(input_dir)
+    wls = [int(f.stem) for f in files]
     lfit_amps = compute.lfits_for_gfit(data, ts, fit_after, bounded_lifetimes)
     if save_lfit_curves:
         fitted = compute.curves_from_fit(lfit_amps, [b.lifetime for b in bounded_lifetimes], ts)
@@ -706,11 +709,15 @@ def double_fit(da_dir, cd_dir, output_dir, fit_after, lifetimes, save_gfit_curve
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
     bounded_lifetimes = compute.bounded_lifetimes_from_args(lifetimes)
-    da_data, ts = load_dir_into_arr(da_dir)
-    da_wls = [int(f.stem) for f in sorted(da_dir.iterdir()) if f.suffix == ".txt"]
-    cd_data, _ = load_dir_into_arr(cd_dir)
-    cd_wls = [int(f.stem) for f in sorted(cd_dir.iterdir()) if f.suffix == ".txt"]
-    combined_data = np.hstack((da_data, cd_data))
+    da_files = core.txt_files(da_dir)
+    da_wls = [int(f.stem) for f in da_files]
+    cd_files = core.txt_files(cd_dir)
+    cd_wls = [int(f.stem) for f in cd_files]
+    # The dA and dCD curves are loaded side by side into a single array for the fits
+    ts = core.load_txt(da_files[0])[:, 0]
+    combined_data = np.empty((len(ts), len(da_files) + len(cd_files)), order="F")
+    core.load_columns_into_arr(da_files, combined_data)
+    core.load_columns_into_arr(cd_files, combined_data, offset=len(da_files))
     lfit_amps = compute.lfits_for_gfit(combined_data, ts, fit_after, bounded_lifetimes)
     gfit_amps, gfit_lifetimes = compute.global_fit(combined_data, ts, fit_after, lfit_amps, bounded_lifetimes)
     if save_lfit_curves:
@@ -738,10 +745,10 @@ def fixed_double_fit(da_dir, cd_dir, output_dir, fit_after, lifetimes, save_gfit
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
     bounded_lifetimes = compute.bounded_lifetimes_from_args(lifetimes)
-    da_data, ts = load_dir_into_arr(da_dir)
-    da_wls = [int(f.stem) for f in sorted(da_dir.iterdir()) if f.suffix == ".txt"]
-    cd_data, _ = load_dir_into_arr(cd_dir)
-    cd_wls = [int(f.stem) for f in sorted(cd_dir.iterdir()) if f.suffix == ".txt"]
+    da_data, ts, da_files = load_dir_into_arr(da_dir)
+    da_wls = [int(f.stem) for f in da_files]
+    cd_data, _, cd_files = load_dir_into_arr(cd_dir)
+    cd_wls = [int(f.stem) for f in cd_files]
     da_lfit_amps = compute.lfits_for_gfit(da_data, ts, fit_after, bounded_lifetimes)
     cd_lfit_amps = compute.lfits_for_gfit(cd_data, ts, fit_after, bounded_lifetimes)
     da_gfit_amps, gfit_lifetimes = compute.global_fit(da_data, ts, fit_after, da_lfit_amps, bounded_lifetimes)
@@ -772,9 +779,10 @@ def txtdir2npy(input_dir, output_file):
     """
     input_dir = Path(input_dir)
     output_file = Path(output_file)
-    data, xs = load_dir_into_arr(input_dir)
-    xs = xs.reshape((len(xs), 1))
-    out_data = np.hstack((xs, data))
+    data, xs, _ = load_dir_into_arr(input_dir)
+    out_data = np.empty((data.shape[0], data.shape[1] + 1), dtype=data.dtype)
+    out_data[:, 0] = xs
+    out_data[:, 1:] = data
     np.save(output_file, out_data)
 
 
@@ -797,15 +805,14 @@ def fft_filter(data_file, filter_file, scale, f_upper, f_lower):
     """
     data_file = Path(data_file)
     filter_file = Path(filter_file)
-    with h5py.File(data_file, "r") as infile:
-        data = np.empty_like(infile["data"])
-        infile["data"].read_direct(data, np.s_[:, :, :], np.s_[:, :, :])
-    filtered = noise.reject_fft(data, scale, f_upper, f_lower)
+    with core.open_data_file(data_file) as infile:
+        band_sums = core.shot_block_reduce(infile["data"],
+                                           lambda block: noise.fft_band_sums(block, f_upper, f_lower))
+    filtered = noise.reject_fft(band_sums, scale)
     if filter_file.exists():
         old_filtered = noise.load_filter_list(filter_file)
         filtered = noise.merge_filter_lists(filtered, old_filtered)
-    with filter_file.open("w") as f:
-        json.dump(filtered, f)
+    noise.save_filter_list(filter_file, filtered)
 
 
 @click.command()
@@ -819,15 +826,13 @@ def int_filter(data_file, filter_file, scale, start, stop):
     """
     data_file = Path(data_file)
     filter_file = Path(filter_file)
-    with h5py.File(data_file, "r") as infile:
-        data = np.empty_like(infile["data"])
-        infile["data"].read_direct(data, np.s_[:, :, :], np.s_[:, :, :])
-    filtered = noise.reject_integral(data, scale, start, stop)
+    with core.open_data_file(data_file) as infile:
+        sums = core.shot_block_reduce(infile["data"], lambda block: noise.integral_sums(block, start, stop))
+    filtered = noise.reject_integral(sums, scale)
     if filter_file.exists():
         old_filtered = noise.load_filter_list(filter_file)
         filtered = noise.merge_filter_lists(filtered, old_filtered)
-    with filter_file.open("w") as f:
-        json.dump(filtered, f)
+    noise.save_filter_list(filter_file, filtered)
 
 
 @click.command()
@@ -841,7 +846,7 @@ def filter_avg(data_file, filter_file, output_file):
     filter_file = Path(filter_file)
     output_file = Path(output_file)
     filter_list = noise.load_filter_list(filter_file)
-    with h5py.File(data_file, "r") as infile:
+    with core.open_data_file(data_file) as infile:
         noise.selective_average(infile, output_file, filter_list)
 
 
@@ -854,8 +859,8 @@ def chi2(raw_dir, fit_dir, after):
     """
     raw_dir = Path(raw_dir)
     fit_dir = Path(fit_dir)
-    raw_data, t = load_dir_into_arr(raw_dir)
-    fit_data, _ = load_dir_into_arr(fit_dir)
+    raw_data, t, _ = load_dir_into_arr(raw_dir)
+    fit_data, _, _ = load_dir_into_arr(fit_dir)
     diffs = raw_data[t > after, :] - fit_data[t > after, :]
     points = raw_data[t > after, :].shape[0] * raw_data.shape[1]
     norm = np.linalg.norm(diffs) / points
@@ -880,7 +885,7 @@ def plot_dir(input_dir, output_file, x_lower, x_upper, x_label, y_label, combine
     """
     input_dir = Path(input_dir)
     output_file = Path(output_file)
-    files = sorted([f for f in input_dir.iterdir() if f.suffix == ".txt"])
+    files = core.txt_files(input_dir)
     options = {
         "x_lower": x_lower,
         "x_upper": x_upper,
@@ -910,9 +915,9 @@ def plot_gfit(da_dir, spectra_dir, fitted_curves_dir, output_file):
     spectra_dir = Path(spectra_dir)
     fitted_curves_dir = Path(fitted_curves_dir)
     output_file = Path(output_file)
-    raw_files = sorted([f for f in da_dir.iterdir() if f.suffix == ".txt"])
-    curve_files = sorted([f for f in fitted_curves_dir.iterdir() if f.suffix == ".txt"])
-    spectra_files = sorted([f for f in spectra_dir.iterdir() if f.suffix == ".txt"])
+    raw_files = core.txt_files(da_dir)
+    curve_files = core.txt_files(fitted_curves_dir)
+    spectra_files = core.txt_files(spectra_dir)
     veusz.plot_gfit(raw_files, curve_files, spectra_files, output_file)
 
 
@@ -959,8 +964,7 @@ def add_to_filter(input_dir, filter_file, index):
     shots = sorted([int(f.stem) - 1 for f in input_dir.iterdir() if f.suffix == ".png"])
     tmp_filtered = {index: shots}
     new_filtered = noise.merge_filter_lists(old_filtered, tmp_filtered)
-    with filter_file.open("w") as f:
-        json.dump(new_filtered, f)
+    noise.save_filter_list(filter_file, new_filtered)
 
 
 @click.command()
@@ -972,16 +976,15 @@ def filter_from_fits(data_file, filter_file, fit_dir, scale):
     data_file = Path(data_file)
     filter_file = Path(filter_file)
     fit_dir = Path(fit_dir)
-    with h5py.File(data_file, "r") as infile:
+    with core.open_data_file(data_file) as infile:
         data = np.empty_like(infile["data"])
         infile["data"].read_direct(data, np.s_[:, :, :], np.s_[:, :, :])
-    fits, t = core.load_dir_into_arr(fit_dir)
+    fits, t, _ = core.load_dir_into_arr(fit_dir)
     filtered = noise.filter_from_fits(data, fits, t, scale)
     if filter_file.exists():
         old_filtered = noise.load_filter_list(filter_file)
         filtered = noise.merge_filter_lists(filtered, old_filtered)
-    with filter_file.open("w") as f:
-        json.dump(filtered, f)
+    noise.save_filter_list(filter_file, filtered)
 
 cli.add_command(assemble)
 cli.add_command(da)
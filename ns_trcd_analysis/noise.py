@@ -1,55 +1,83 @@
-import h5py
 import numpy as np
 import json
-from scipy.interpolate import interp1d
-from .core import POINTS, time_axis
+from .core import POINTS, open_data_file, time_axis
 
 
-def reject_sigma(data, sigmas):
+def shot_stddevs(data) -> np.ndarray:
+    """Compute the standard deviation of each curve in a (points, shots, wavelengths) array.
+
+    The result has the shape (shots, wavelengths).
+    """
+    return data.std(axis=0)
+
+
+def reject_sigma(stddevs, sigmas):
     """Reject shots whose noise is a multiple of the average noise.
+
+    The noise of each shot is computed by `shot_stddevs`, which allows it to be computed
+    a few shots at a time.
     """
-    _, shots, num_wls = data.shape
+    shots, num_wls = stddevs.shape
+    avg_stddevs = stddevs.mean(axis=0)
     rejected = {}
     for wl_idx in range(num_wls):
-        avg_stddev = data[:, :, wl_idx].std(axis=0).mean()
         rejected_shots = list()
-        shot_noises = data[:, :, wl_idx].std(axis=0)
         for shot_idx in range(shots):
-            if shot_noises[shot_idx] > (sigmas * avg_stddev):
+            if stddevs[shot_idx, wl_idx] > (sigmas * avg_stddevs[wl_idx]):
                 rejected_shots.append(shot_idx)
         rejected[wl_idx] = rejected_shots
     return rejected
 
 
-def reject_fft(data, scale, upper, lower):
-    """Reject shots that have too much noise in a given frequency band.
+def fft_band_sums(data, upper, lower) -> np.ndarray:
+    """Integrate the FFT of each curve in a (points, shots, wavelengths) array over a frequency band.
+
+    The result has the shape (shots, wavelengths).
     """
     ffts = np.absolute(np.fft.rfft(data, axis=0))
     freqs = np.fft.fftfreq(data.shape[0], 0.02)[:(data.shape[0] // 2 + 1)]
     freqs[-1] *= -1  # Highest freq is always negative for whatever reason
     band_indices = (freqs > lower) & (freqs < upper)
-    band_sums = np.apply_along_axis(lambda x: np.sum(x[band_indices]), 0, ffts)
+    return np.sum(ffts[band_indices, :, :], axis=0)
+
+
+def reject_fft(band_sums, scale):
+    """Reject shots that have too much noise in a given frequency band.
+
+    The band sums are computed by `fft_band_sums`, which allows the FFTs to be computed
+    a few shots at a time.
+    """
     band_means = np.mean(band_sums, axis=0)
     rejected = {}
-    for wl in range(data.shape[2]):
+    for wl in range(band_sums.shape[1]):
         rejected[wl] = []
-        for shot in range(data.shape[1]):
+        for shot in range(band_sums.shape[0]):
             if band_sums[shot, wl] > scale * band_means[wl]:
                 rejected[wl].append(shot)
     return rejected
 
 
-def reject_integral(data, scale, start, stop):
-    """Reject shots based on the integral between a start and stop time.
+def integral_sums(data, start, stop) -> np.ndarray:
+    """Integrate each curve in a (points, shots, wavelengths) array between a start and stop time.
+
+    The result has the shape (shots, wavelengths).
     """
     ts = time_axis()
     t_range = (ts > start) & (ts < stop)
-    sums = np.absolute(np.sum(data[t_range, :, :], axis=0))
+    return np.absolute(np.sum(data[t_range, :, :], axis=0))
+
+
+def reject_integral(sums, scale):
+    """Reject shots based on the integral between a start and stop time.
+
+    The integrals are computed by `integral_sums`, which allows them to be computed
+    a few shots at a time.
+    """
     means = np.mean(sums, axis=0)
     rejected = {}
-    for wl in range(data.shape[2]):
+    for wl in range(sums.shape[1]):
         rejected[wl] = []
-        for shot in range(data.shape[1]):
+        for shot in range(sums.shape[0]):
             if sums[shot, wl] < scale * means[wl]:
                 rejected[wl].append(shot)
     return rejected
@@ -68,7 +96,7 @@ def selective_average(infile, outfile, rejections):
     for wl_idx in range(num_wls):
         scale_factor = shots / (shots - len(rejections[wl_idx]))
         average[:, wl_idx] *= scale_factor
-    with h5py.File(outfile, "w") as outfile:
+    with open_data_file(outfile, "w") as outfile:
         outfile.copy(infile["wavelengths"], "wavelengths")
         outfile.create_dataset("data", data=data)
         outfile.create_dataset("average", data=average)
@@ -78,13 +106,18 @@ def selective_average(infile, outfile, rejections):
 def load_filter_list(filename):
     """Load a filter list from a JSON file.
     """
-    with filename.open("r") as f:
-        tmp = json.load(f)
+    tmp = json.loads(filename.read_bytes())
     # Keys get loaded as strings, need to convert to ints
-    loaded = {}
-    for k in tmp.keys():
-        loaded[int(k)] = tmp[k]
-    return loaded
+    return {int(k): v for k, v in tmp.items()}
+
+
+def save_filter_list(filename, filter_list):
+    """Save a filter list to a JSON file.
+
+    The list is serialized in one go without whitespace, which keeps the files small for
+    datasets with thousands of shots.
+    """
+    filename.write_text(json.dumps(filter_list, separators=(",", ":")))
 
 
 def merge_filter_lists(a, b):
@@ -112,13 +145,14 @@ def merge_filter_lists(a, b):
 def filter_from_fits(da, fits, collapsed_t, scale):
     """Use the global fits to determine the noise in individual curves for rejection.
     """
+    from scipy.interpolate import interp1d
     points, shots, n_wls = da.shape
     rejections = dict()
     # The time axis is often shifted during processing (by just a point or two),
     # so we want to interpolate with the shifted time axis rather than the default
     # time axis.
     shifted_t = time_axis()
-    shifted_t += collapsed_t[0] - shifted_t[0]
+    shifted_t = shifted_t + (collapsed_t[0] - shifted_t[0])
     # The collapsed time doesn't extend all the way to the end of the time interval
     # (since those last few points were collapsed), so we can't interpolate all the
     # way to the end of the uncollapsed time axis. We need to cut the last few time
@@ -1,18 +1,18 @@
 import click
 import numpy as np
-import h5py
-from itertools import product
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List
-from .core import count_subdirs
+from .core import count_subdirs, open_data_file, raw_chunk_shape, COMPRESSION
 
 
 def ingest(input_dir, output_file_path, dark_signals_file=None) -> None:
     """Read the contents of an experiment directory into an HDF5 file.
 
-    If 'incremental' is True, then each shot will be written to the HDF5 file
-    after it is read, otherwise data is read into a temporary array and saved at
-    the very end. The incremental approach is much slower, but is useful when the
-    machine doing the analysis has limited memory.
+    The shots for one wavelength are read into a temporary array and written to the
+    HDF5 file in a single call, so only one wavelength is held in memory at a time.
+    The temporary array is shot-major so that each thread loads its shot into a
+    contiguous block, and it is transposed into the dataset layout once per wavelength.
 
     The directory must have this layout:
     <input dir>
@@ -28,40 +28,54 @@ def ingest(input_dir, output_file_path, dark_signals_file=None) -> None:
     At the experiment time resolution (20ns for 400us) you get 20,000 points. There are 3 channels
     (parallel, perpendicular, and reference). The last dimension is the number of pump states. This
     is now 1 (there's always a pump state), but it is retained for backwards compatibility.
+    The samples are stored as 32-bit floats, which is plenty for the oscilloscope's ADC resolution.
     """
     num_shots = count_subdirs(input_dir)
     wls = collect_wavelengths(input_dir / "0001")
+    cleaned_ds = None
     if dark_signals_file is not None:
-        dark_sigs = np.load(dark_signals_file)
-    with h5py.File(output_file_path, "w") as outfile:
-        tmp_arr = np.empty((20_000, 3, num_shots, len(wls), 1))
-        outfile.create_dataset("data", (20_000, 3, num_shots, len(wls), 1))
+        cleaned_ds = compute_cleaned_dark_sig(np.load(dark_signals_file))
+    with open_data_file(output_file_path, "w") as outfile:
+        chunks = raw_chunk_shape(20_000, num_shots)
+        outfile.create_dataset("data", (20_000, 3, num_shots, len(wls), 1), dtype=np.float32, chunks=chunks,
+                               **COMPRESSION)
         data = outfile["data"]
-        outfile.create_dataset("wavelengths", (len(wls),), data=wls)
-        dir_indices = [x for x in product(range(1, num_shots + 1), range(len(wls)))]
-        with click.progressbar(dir_indices, label="Reading data") as indices:
-            for shot_index, wl_index in indices:
-                datadir = input_dir / f"{shot_index:04d}" / f"{wls[wl_index]}"
-                tmp_arr[:, 0, shot_index - 1, wl_index, 0] = np.load(datadir / "par.npy")
-                tmp_arr[:, 1, shot_index - 1, wl_index, 0] = np.load(datadir / "perp.npy")
-                tmp_arr[:, 2, shot_index - 1, wl_index, 0] = np.load(datadir / "ref.npy")
-        if dark_signals_file is not None:
-            cleaned_ds = compute_cleaned_dark_sig(dark_sigs)
-            for i in range(3):
-                tmp_arr[:, i, :, :] -= cleaned_ds[i]
-        data.write_direct(tmp_arr, np.s_[:, :, :, :, :], np.s_[:, :, :, :, :])
+        outfile.create_dataset("wavelengths", data=wls)
+        tmp_arr = np.empty((num_shots, 3, 20_000), dtype=np.float32)
+        out_arr = np.empty((20_000, 3, num_shots), dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            with click.progressbar(range(len(wls)), label="Reading data") as wl_indices:
+                for wl_index in wl_indices:
+                    futures = [
+                        ex.submit(load_shot, input_dir / f"{s:04d}" / f"{wls[wl_index]}", tmp_arr, s)
+                        for s in range(1, num_shots + 1)
+                    ]
+                    for fut in as_completed(futures):
+                        fut.result()
+                    if cleaned_ds is not None:
+                        for i in range(3):
+                            tmp_arr[:, i, :] -= cleaned_ds[i]
+                    np.copyto(out_arr, tmp_arr.transpose())
+                    data.write_direct(out_arr, np.s_[:, :, :], np.s_[:, :, :, wl_index, 0])
+
+
+def load_shot(datadir, arr, shot_index) -> None:
+    """Load the three channels of a single shot into a (shots, channels, points) array.
+
+    This is called from a thread pool, and reading the files releases the GIL, so the
+    loads for different shots run concurrently. The files are memory-mapped so that each
+    channel is copied straight into `arr` without an intermediate array.
+    """
+    arr[shot_index - 1, 0, :] = np.load(datadir / "par.npy", mmap_mode="r")
+    arr[shot_index - 1, 1, :] = np.load(datadir / "perp.npy", mmap_mode="r")
+    arr[shot_index - 1, 2, :] = np.load(datadir / "ref.npy", mmap_mode="r")
 
 
 def collect_wavelengths(path) -> List[int]:
     """Collect the wavelengths from a shot directory.
     """
-    wls = []
-    for d in path.iterdir():
-        if d.name[0] == "_":
-            continue
-        if not d.is_dir():
-            continue
-        wls.append(int(d.name))
+    with os.scandir(path) as entries:
+        wls = [int(e.name) for e in entries if e.name[0] != "_" and e.is_dir()]
     return sorted(wls)
 
 
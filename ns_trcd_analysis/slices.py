@@ -41,9 +41,10 @@ def index_nearest_to_value(arr, value) -> Union[int, None]:
 
 def abs_slice_at_index(infile, t_idx, wl_idx) -> np.ndarray:
     """Return an absorption slice along the shot axis.
+
+    The parallel and reference channels (0 and 2) are read with a single strided selection.
     """
     ds = infile["data"]
-    par = ds[t_idx, 0, :, wl_idx, 0]
-    ref = ds[t_idx, 2, :, wl_idx, 0]
+    par, ref = ds[t_idx, 0:3:2, :, wl_idx, 0]
     absorption = -np.log10(par / ref)
     return absorption
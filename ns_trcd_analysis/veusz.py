@@ -1,5 +1,6 @@
 import os
 from itertools import chain
+from .core import txt_files
 
 
 style_settings = """Set('colorTheme', u'default-latest')
@@ -213,12 +214,12 @@ def dataset_groups_from_dirs(dirs, labels=None):
     """Group corresponding datasets from a collection of directories."""
     if labels:
         datasets = [
-            [Dataset(f, name=f"{f.stem}_{label}") for f in sorted(d.iterdir()) if f.suffix == ".txt"]
+            [Dataset(f, name=f"{f.stem}_{label}") for f in txt_files(d)]
             for d, label in zip(dirs, labels)
         ]
     else:
         datasets = [
-            [Dataset(f) for f in sorted(d.iterdir()) if f.suffix == ".txt"]
+            [Dataset(f) for f in txt_files(d)]
             for d in dirs
         ]
     # Collects the first datasets from each list into a new list, then the second
@@ -0,0 +1,45 @@
+import numpy as np
+from ns_trcd_analysis import compute, core
+
+
+def collapse_reference(data, times, cpoints):
+    """The original point-by-point collapse, without the empty groups it could produce.
+    """
+    cutoffs = [int(np.argmax(data[:, 0] >= t)) for t in times] + [data.shape[0] + 1]
+    sections = [data[:cutoffs[0], :]]
+    for i in range(len(cutoffs) - 1):
+        start, stop = cutoffs[i], cutoffs[i + 1]
+        splits = np.array_split(data[start:stop, :], np.ceil((stop - start) / cpoints[i]))
+        sections.append(np.vstack([s.mean(axis=0) for s in splits if s.shape[0] > 0]))
+    return np.vstack(sections)
+
+
+def make_data():
+    ts = core.time_axis()
+    data = np.empty((len(ts), 2))
+    data[:, 0] = ts
+    data[:, 1] = np.random.default_rng(0).normal(size=len(ts))
+    return data
+
+
+def test_collapse_matches_original():
+    data = make_data()
+    collapsed = compute.collapse(data, [1.0, 100.0], [5, 50])
+    np.testing.assert_allclose(collapsed, collapse_reference(data, [1.0, 100.0], [5, 50]))
+
+
+def test_collapse_last_interval_multiple_of_cpoints():
+    data = make_data()
+    start = int(np.argmax(data[:, 0] >= 100.0))
+    cpoints = 50
+    assert (data.shape[0] - start) % cpoints == 0
+    collapsed = compute.collapse(data, [100.0], [cpoints])
+    np.testing.assert_allclose(collapsed, collapse_reference(data, [100.0], [cpoints]))
+
+
+def test_collapse_single_point_last_interval():
+    data = make_data()
+    collapsed = compute.collapse(data, [2.0], [1])
+    assert collapsed.shape == data.shape
+    assert not np.any(np.isnan(collapsed))
+    np.testing.assert_allclose(collapsed, data)
@@ -0,0 +1,17 @@
+import numpy as np
+from ns_trcd_analysis import core
+
+
+def test_load_txt_round_trips_save_txt(tmp_path):
+    path = tmp_path / "data.txt"
+    arr = np.random.default_rng(0).normal(scale=1e-3, size=(200_000, 2))
+    core.save_txt(arr, path)
+    loaded = core.load_txt(path)
+    assert np.array_equal(loaded, arr)
+
+
+def test_load_txt_reads_savetxt_exactly(tmp_path):
+    path = tmp_path / "data.txt"
+    arr = np.random.default_rng(1).normal(scale=1e-3, size=(200_000, 2))
+    np.savetxt(path, arr, delimiter=",")
+    assert np.array_equal(core.load_txt(path), np.loadtxt(path, delimiter=","))
@@ -0,0 +1,20 @@
+import h5py
+import numpy as np
+from ns_trcd_analysis import raw2hdf5
+
+
+def test_ingest_layout(tmp_path):
+    rng = np.random.default_rng(0)
+    shots, wls = 3, [500, 510]
+    expected = rng.normal(size=(20_000, 3, shots, len(wls))).astype(np.float32)
+    for s in range(shots):
+        for w, wl in enumerate(wls):
+            shot_dir = tmp_path / "raw" / f"{s + 1:04d}" / f"{wl}"
+            shot_dir.mkdir(parents=True)
+            for c, name in enumerate(["par", "perp", "ref"]):
+                np.save(shot_dir / f"{name}.npy", expected[:, c, s, w])
+    raw2hdf5.ingest(tmp_path / "raw", tmp_path / "raw.h5")
+    with h5py.File(tmp_path / "raw.h5", "r") as f:
+        assert f["data"].shape == (20_000, 3, shots, len(wls), 1)
+        assert np.array_equal(f["data"][:, :, :, :, 0], expected)
+        assert list(f["wavelengths"][:]) == wls